@@ -1,5 +1,20 @@
 import os
-from typing import Dict, Any, Optional
+import functools
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
+
+@functools.lru_cache(maxsize=1)
+def _creds() -> Mapping[str, Optional[str]]:
+    """Read Reddit credentials from the environment once (None when unset)"""
+    return MappingProxyType({
+        'client_id': os.getenv('REDDIT_CLIENT_ID'),
+        'client_secret': os.getenv('REDDIT_CLIENT_SECRET'),
+        'user_agent': os.getenv('REDDIT_USER_AGENT')
+    })
+
+def invalidate_creds() -> None:
+    """Drop the cached credentials so the environment is re-read (for tests)"""
+    _creds.cache_clear()
 
 class Config:
     """Configuration management for the Reddit scraper"""
@@ -7,10 +22,11 @@ class Config:
     @staticmethod
     def get_reddit_credentials() -> Dict[str, str]:
         """Get Reddit API credentials from environment variables"""
+        creds = _creds()
         return {
-            'client_id': os.getenv('REDDIT_CLIENT_ID', ''),
-            'client_secret': os.getenv('REDDIT_CLIENT_SECRET', ''),
-            'user_agent': os.getenv('REDDIT_USER_AGENT', 'RedditScraper/1.0')
+            'client_id': creds['client_id'] or '',
+            'client_secret': creds['client_secret'] or '',
+            'user_agent': creds['user_agent'] or 'RedditScraper/1.0'
         }
     
     @staticmethod
@@ -1,30 +1,59 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import traceback
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from typing import Any, Callable, Dict, Iterator, List
+import hashlib
+import json
+import logging
 import os
+import threading
+from pathlib import Path
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
+from config import _creds
 from models import ScrapeRequest, ScrapeResponse, CredentialTestResponse
-from reddit_scraper import RedditScraper
 
-# Load environment variables
-load_dotenv()
+# Load environment variables from the .env next to this file when present, regardless of the
+# working directory; deployments that inject the environment directly can set DISABLE_DOTENV=1
+DOTENV_PATH = Path(__file__).with_name(".env")
+if os.getenv("DISABLE_DOTENV") != "1" and DOTENV_PATH.exists():
+    load_dotenv(DOTENV_PATH, override=False)
+
+# Defaults to WARNING so per-post debug logging costs nothing unless asked for
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Identical scrape configs within this many seconds are served from memory (0 disables)
+SCRAPE_CACHE_TTL = int(os.getenv("SCRAPE_CACHE_TTL", "120"))
+# Total bytes of cached bodies; a single body larger than an eighth of this is never buffered or cached
+SCRAPE_CACHE_MAX_BYTES = int(os.getenv("SCRAPE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SCRAPE_CACHE_MAX_ENTRY_BYTES = SCRAPE_CACHE_MAX_BYTES // 8
+_scrape_cache: TTLCache = TTLCache(maxsize=max(SCRAPE_CACHE_MAX_BYTES, 1), ttl=max(SCRAPE_CACHE_TTL, 1), getsizeof=len)
+# TTLCache isn't thread-safe and the streamed body is produced in the threadpool
+_scrape_cache_lock = threading.Lock()
 
 app = FastAPI(
     title="Reddit Signal Scraper",
     description="Extract signals from Reddit subreddits, posts, and comments",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Configure this properly for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Configure CORS only when browser origins are listed (comma-separated); server-to-server
+# deployments skip the middleware entirely
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "").split(",") if origin.strip()]
+if CORS_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 @app.get("/")
 def root():
@@ -38,12 +67,13 @@ def root():
 @app.get("/health")
 def health():
     """Detailed health check"""
+    creds = _creds()
     return {
         "status": "healthy",
         "environment_variables": {
-            "REDDIT_CLIENT_ID": bool(os.getenv("REDDIT_CLIENT_ID")),
-            "REDDIT_CLIENT_SECRET": bool(os.getenv("REDDIT_CLIENT_SECRET")),
-            "REDDIT_USER_AGENT": bool(os.getenv("REDDIT_USER_AGENT"))
+            "REDDIT_CLIENT_ID": bool(creds['client_id']),
+            "REDDIT_CLIENT_SECRET": bool(creds['client_secret']),
+            "REDDIT_USER_AGENT": bool(creds['user_agent'])
         }
     }
 
@@ -57,9 +87,21 @@ def test_credentials(request: ScrapeRequest):
     has_config_client_secret = bool(config.get('client_secret') or config.get('clientSecret'))
     has_config_user_agent = bool(config.get('user_agent') or config.get('userAgent'))
     
-    has_env_client_id = bool(os.getenv('REDDIT_CLIENT_ID'))
-    has_env_client_secret = bool(os.getenv('REDDIT_CLIENT_SECRET'))
-    has_env_user_agent = bool(os.getenv('REDDIT_USER_AGENT'))
+    creds = _creds()
+    has_env_client_id = bool(creds['client_id'])
+    has_env_client_secret = bool(creds['client_secret'])
+    has_env_user_agent = bool(creds['user_agent'])
+    
+    # The scraper only reads credentials from the environment, so only those can be verified
+    credentials_verified = None
+    if has_env_client_id and has_env_client_secret:
+        from reddit_scraper import RedditScraper
+        try:
+            credentials_verified = RedditScraper(config).verify_credentials()
+        except Exception as e:
+            # Building the client can fail too (e.g. PRAW rejects a missing user agent)
+            logger.warning("Could not build Reddit client: %s", e)
+            credentials_verified = False
     
     return CredentialTestResponse(
         config_keys=list(config.keys()),
@@ -75,37 +117,91 @@ def test_credentials(request: ScrapeRequest):
         },
         credentials_source="environment" if (has_env_client_id and has_env_client_secret) 
                           else "config" if (has_config_client_id and has_config_client_secret)
-                          else "none"
+                          else "none",
+        credentials_verified=credentials_verified
     )
 
-@app.post("/scrape", response_model=ScrapeResponse)
-def scrape(request: ScrapeRequest):
-    """Main scraping endpoint"""
+def _stream_scrape(source_batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """Encode scraped items as a ScrapeResponse JSON document, one source at a time"""
+    yield b'{"status":"success","data":['
+    count = 0
+    for source_data in source_batches:
+        if not source_data:
+            continue
+        if count:
+            yield b','
+        yield b','.join(orjson.dumps(item) for item in source_data)
+        count += len(source_data)
+    logger.info("Successfully scraped %d items", count)
+    yield b'],' + orjson.dumps({"count": count, "message": f"Successfully scraped {count} items"})[1:]
+
+def _scrape_cache_key(config: Dict[str, Any]) -> str:
+    """Hash the normalized scrape config so key order doesn't matter"""
+    # stdlib json: unlike orjson it accepts any valid JSON (e.g. integers beyond 64 bits),
+    # and default=str means building a key can never fail the request
+    return hashlib.blake2b(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+def _cache_stream(key: str, chunks: Iterator[bytes], cacheable: Callable[[], bool]) -> Iterator[bytes]:
+    """Pass chunks through, caching the full body once the stream completes if cacheable() allows"""
+    body = []
+    size = 0
+    for chunk in chunks:
+        if body is not None:
+            size += len(chunk)
+            if size > SCRAPE_CACHE_MAX_ENTRY_BYTES:
+                # Too large to cache; stop buffering so streaming keeps its memory bound
+                body = None
+            else:
+                body.append(chunk)
+        yield chunk
+    if body is None or not cacheable():
+        return
+    # Join outside the lock: the async handler takes it on the event loop for lookups
+    body = b''.join(body)
+    with _scrape_cache_lock:
+        _scrape_cache[key] = body
+
+# No response_model: the streamed body is never validated, ScrapeResponse only documents its shape
+@app.post("/scrape", responses={200: {"model": ScrapeResponse}})
+async def scrape(request: ScrapeRequest, nocache: bool = False):
+    """Main scraping endpoint; streams the response as each source completes"""
+    # Async so cache hits never take a threadpool slot; blocking PRAW work stays off the
+    # loop because Starlette iterates the synchronous response body in its threadpool
     try:
-        print(f"📥 Received scrape request with {len(request.config.get('sources', []))} sources")
+        sources = request.config.get('sources', [])
+        # The scraper validates the config; a malformed 'sources' must not fail here first
+        logger.info("Received scrape request with %d sources", len(sources) if isinstance(sources, list) else 0)
         
-        # Create scraper instance
-        scraper = RedditScraper(request.config)
+        use_cache = SCRAPE_CACHE_TTL > 0 and SCRAPE_CACHE_MAX_ENTRY_BYTES > 0 and not nocache
+        if use_cache:
+            cache_key = _scrape_cache_key(request.config)
+            with _scrape_cache_lock:
+                cached_body = _scrape_cache.get(cache_key)
+            if cached_body is not None:
+                logger.info("Serving scrape from cache")
+                return Response(content=cached_body, media_type="application/json")
         
-        # Fetch data
-        data = scraper.fetch_data()
+        # Imported lazily so / and /health don't pay PRAW's import cost
+        from reddit_scraper import RedditScraper
         
-        print(f"✅ Successfully scraped {len(data)} items")
+        # Create scraper instance (first use imports PRAW and builds the client)
+        scraper = await run_in_threadpool(RedditScraper, request.config)
         
-        return ScrapeResponse(
-            status="success",
-            data=data,
-            count=len(data),
-            message=f"Successfully scraped {len(data)} items"
-        )
+        # Configuration is validated here; sources are fetched while the body streams
+        source_batches = scraper.fetch_data_streaming()
+        
+        body = _stream_scrape(source_batches)
+        if use_cache:
+            # Partial or empty results (e.g. during a Reddit outage) must not be served for the whole TTL
+            body = _cache_stream(cache_key, body, lambda: not scraper.failed_sources and scraper.item_count > 0)
+        return StreamingResponse(body, media_type="application/json")
         
     except ValueError as e:
-        print(f"❌ Configuration error: {e}")
+        logger.warning("Configuration error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
         
     except Exception as e:
-        print("❌ Exception during scrape:")
-        traceback.print_exc()
+        logger.exception("Exception during scrape")
         raise HTTPException(
             status_code=500, 
             detail=f"Scraping failed: {str(e)}"
@@ -114,13 +210,12 @@ def scrape(request: ScrapeRequest):
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler for debugging"""
-    print(f"❌ Unhandled exception: {exc}")
-    traceback.print_exc()
-    return JSONResponse(
+    logger.error("Unhandled exception: %s", exc, exc_info=exc)
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "Internal server error occurred"}
     )
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_level=LOG_LEVEL.lower())
@@ -18,6 +18,7 @@ class CredentialTestResponse(BaseModel):
     has_config_credentials: Dict[str, bool] = Field(..., description="Credentials in config")
     has_env_credentials: Dict[str, bool] = Field(..., description="Credentials in environment")
     credentials_source: str = Field(..., description="Source of credentials")
+    credentials_verified: Optional[bool] = Field(default=None, description="Whether Reddit accepted the environment credentials")
 
 class SubredditSource(BaseModel):
     """Model for subreddit source configuration"""
@@ -27,6 +28,9 @@ class SubredditSource(BaseModel):
     sort: Optional[str] = Field(default="hot", description="Sort order (hot, new, top, rising)")
     search_keywords: Optional[List[str]] = Field(default=[], description="Keywords to search for")
     time_filter: Optional[str] = Field(default="day", description="Time filter for top posts")
+    comment_depth: Optional[int] = Field(default=0, description="Comment reply depth to fetch (0 skips comments)")
+    replace_more_limit: Optional[int] = Field(default=32, description="Max 'load more comments' expansions per post (null fetches all)")
+    include_extended_fields: Optional[bool] = Field(default=False, description="Include upvote ratio, domain and post flags")
 
 class RedditCredentials(BaseModel):
     """Model for Reddit API credentials"""
@@ -1,142 +1,267 @@
-import praw
-import os
-from typing import List, Dict, Any
-from datetime import datetime
-import time
+import contextlib
+import functools
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Optional, Tuple
+from time import gmtime as _gmtime, strftime as _strftime
+
+from config import _creds
+
+if TYPE_CHECKING:
+    import praw
+
+logger = logging.getLogger(__name__)
+
+# PRAW isn't thread-safe, so each praw.Reddit client is only ever used by the thread that has
+# checked it out of a fixed per-credential pool. Listings and credential checks get their own
+# pool so long comment expansions can't starve them. Executors are sized to these pools.
+LISTING_POOL_SIZE = 2
+COMMENT_POOL_SIZE = 4
+# Seconds to wait for a listing client before failing the source or credential check
+CLIENT_CHECKOUT_TIMEOUT = 30
+# Default cap on MoreComments expansions per submission; a source can set None to fetch everything
+DEFAULT_REPLACE_MORE_LIMIT = 32
+# Subreddit listing methods a source may use as its sort
+_SORT_METHODS = ('hot', 'new', 'top', 'rising')
+
+
+@functools.lru_cache(maxsize=128)
+def _build_search_query(keywords: Tuple[str, ...]) -> str:
+    """Join keywords into an exact-phrase OR query, cached per keyword tuple"""
+    return ' OR '.join(f'"{keyword}"' for keyword in keywords)
+
+
+def _format_utc(timestamp: float) -> str:
+    """Format a Unix timestamp as an ISO 8601 UTC string without building a datetime"""
+    return _strftime('%Y-%m-%dT%H:%M:%S', _gmtime(timestamp))
+
+
+def _build_reddit_client(client_id: str, client_secret: str, user_agent: str) -> "praw.Reddit":
+    """Build one Reddit client with its own connection pool"""
+    # Imported here so importing this module doesn't pay for PRAW and its dependencies
+    import praw
+    import requests
+
+    return praw.Reddit(
+        client_id=client_id,
+        client_secret=client_secret,
+        user_agent=user_agent,
+        check_for_async=False,
+        ratelimit_seconds=600,
+        # Per-client session keeps connections alive between scrapes
+        requestor_kwargs={'session': requests.Session()}
+    )
+
+def _build_client_pool(client_id: str, client_secret: str, user_agent: str, size: int) -> "queue.Queue[praw.Reddit]":
+    pool = queue.Queue()
+    for _ in range(size):
+        pool.put(_build_reddit_client(client_id, client_secret, user_agent))
+    return pool
+
+@functools.lru_cache(maxsize=4)
+def _get_client_pools(client_id: str, client_secret: str, user_agent: str) -> Tuple["queue.Queue[praw.Reddit]", "queue.Queue[praw.Reddit]"]:
+    """Build the listing and comment client pools once per credential set and reuse them across scrapes"""
+    return (_build_client_pool(client_id, client_secret, user_agent, LISTING_POOL_SIZE),
+            _build_client_pool(client_id, client_secret, user_agent, COMMENT_POOL_SIZE))
+
+@contextlib.contextmanager
+def _checkout(pool: "queue.Queue[praw.Reddit]", timeout: Optional[float] = None) -> Iterator["praw.Reddit"]:
+    """Borrow a client for the calling thread's exclusive use"""
+    try:
+        client = pool.get(timeout=timeout)
+    except queue.Empty:
+        raise TimeoutError(f"No Reddit client became free within {timeout} seconds") from None
+    try:
+        yield client
+    finally:
+        pool.put(client)
 
 class RedditScraper:
     """Reddit scraper using PRAW (Python Reddit API Wrapper)"""
     
     def __init__(self, config: Dict[str, Any]):
         self.config = config
+        # Outcome of the last fetch: indices of sources that raised, and items returned
+        self.failed_sources: List[int] = []
+        self.item_count = 0
         self._setup_reddit_client()
     
     def _setup_reddit_client(self):
         """Initialize Reddit API client with credentials"""
-        # --- DEBUG: Check if environment variables are loaded ---
-        client_id = os.getenv('REDDIT_CLIENT_ID')
-        client_secret = os.getenv('REDDIT_CLIENT_SECRET')
-        user_agent = os.getenv('REDDIT_USER_AGENT')
+        creds = _creds()
+        client_id = creds['client_id']
+        client_secret = creds['client_secret']
+        user_agent = creds['user_agent']
         
-        print("--- DEBUG: Loading Credentials from Environment ---")
-        print(f"  -> Client ID Loaded: {'Yes' if client_id else 'No'}")
-        print(f"  -> Client Secret Loaded: {'Yes' if client_secret else 'No'}")
-        print(f"  -> User Agent Loaded: {user_agent}")
-        # --- END DEBUG ---
+        logger.debug("Client ID loaded: %s, client secret loaded: %s, user agent: %s",
+                     bool(client_id), bool(client_secret), user_agent)
         
         if not client_id or not client_secret:
             raise ValueError("Missing Reddit API credentials in environment variables.")
         
+        self._listing_clients, self._comment_clients = _get_client_pools(client_id, client_secret, user_agent)
+
+    def verify_credentials(self) -> bool:
+        """Check the credentials against Reddit by requesting an OAuth token"""
         try:
-            self.reddit = praw.Reddit(
-                client_id=client_id,
-                client_secret=client_secret,
-                user_agent=user_agent,
-                check_for_async=False
-            )
-            # --- DEBUG: Test authentication ---
-            print("  -> PRAW initialized. Checking auth status...")
-            # This will be None if in read-only mode, or a Redditor object if authenticated
-            print(f"  -> PRAW Auth Status (me()): {self.reddit.user.me()}")
-            print("--- DEBUG: Reddit API authentication successful ---")
-            # --- END DEBUG ---
+            with _checkout(self._listing_clients, CLIENT_CHECKOUT_TIMEOUT) as reddit:
+                scopes = reddit.auth.scopes()
+            logger.debug("Reddit API authentication successful, scopes: %s", scopes)
+            return True
         except Exception as e:
-            print(f"--- DEBUG: Reddit API authentication FAILED: {e} ---")
-            raise
+            logger.warning("Reddit API authentication failed: %s", e)
+            return False
 
     def fetch_data(self) -> List[Dict[str, Any]]:
-        # ... (no changes in this function)
+        sources = self._get_sources()
+        # Keep results in source order regardless of completion order
+        results = [[] for _ in sources]
+        for i, source_data in self._iter_sources(sources):
+            results[i] = source_data
         data = []
+        for source_data in results:
+            data.extend(source_data)
+        return data
+
+    def fetch_data_streaming(self) -> Iterator[List[Dict[str, Any]]]:
+        """Yield each source's items as soon as that source finishes (completion order)"""
+        # Validated eagerly so configuration errors surface before any item is yielded
+        sources = self._get_sources()
+        return (source_data for _, source_data in self._iter_sources(sources))
+
+    def _get_sources(self) -> List[Dict[str, Any]]:
         sources = self.config.get('sources', [])
+        if not isinstance(sources, list):
+            raise ValueError("'sources' must be a list of source objects.")
         if not sources:
             raise ValueError("No sources configured.")
-        print(f"🚀 Starting scrape with {len(sources)} sources")
+        # Checked here rather than in the worker threads, where errors are only logged per source
         for i, source in enumerate(sources, 1):
-            try:
-                print(f"📊 Processing source {i}/{len(sources)}: {source.get('name')}")
-                source_data = self._fetch_source(source)
-                data.extend(source_data)
-                print(f"✅ Source {i} completed: {len(source_data)} items")
-                if i < len(sources):
-                    time.sleep(1)
-            except Exception as e:
-                print(f"❌ Error processing source {i}: {e}")
-                continue
-        return data
+            if not isinstance(source, dict):
+                raise ValueError(f"Source {i} must be an object, got {type(source).__name__}")
+            sort_type = source.get('sort', 'hot')
+            # Keyword searches always sort by relevance, so their sort is unused
+            if not source.get('search_keywords') and sort_type not in _SORT_METHODS:
+                raise ValueError(f"Unsupported sort type: {sort_type} (expected one of {', '.join(_SORT_METHODS)})")
+        return sources
+
+    def _iter_sources(self, sources: List[Dict[str, Any]]) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """Fetch sources concurrently, yielding (index, items) as each completes; failed sources are skipped"""
+        logger.info("Starting scrape with %d sources", len(sources))
+        self.failed_sources = []
+        self.item_count = 0
+        # Comment work from every source shares one executor sized to the comment pool;
+        # its threads are only started if a source actually fetches comments
+        with ThreadPoolExecutor(max_workers=COMMENT_POOL_SIZE) as comment_executor, \
+                ThreadPoolExecutor(max_workers=min(LISTING_POOL_SIZE, len(sources))) as executor:
+            futures = {executor.submit(self._fetch_source, source, comment_executor): i for i, source in enumerate(sources)}
+            for future in as_completed(futures):
+                # Drop our reference so a streamed source's items can be freed once consumed
+                i = futures.pop(future)
+                try:
+                    source_data = future.result()
+                except Exception as e:
+                    logger.error("Error processing source %d: %s", i + 1, e)
+                    self.failed_sources.append(i)
+                    continue
+                self.item_count += len(source_data)
+                logger.info("Source %d (%s) completed: %d items", i + 1, sources[i].get('name'), len(source_data))
+                yield i, source_data
 
-    def _fetch_source(self, source: Dict[str, Any]) -> List[Dict[str, Any]]:
-        # ... (no changes in this function)
+    def _fetch_source(self, source: Dict[str, Any], comment_executor: ThreadPoolExecutor) -> List[Dict[str, Any]]:
         source_type = source.get('type', 'subreddit')
         if source_type == 'subreddit':
-            return self._fetch_subreddit(source)
+            return self._fetch_subreddit(source, comment_executor)
         else:
             raise ValueError(f"Unsupported source type: {source_type}")
 
-    def _fetch_subreddit(self, source: Dict[str, Any]) -> List[Dict[str, Any]]:
-        # ... (code to get config is the same)
+    def _fetch_subreddit(self, source: Dict[str, Any], comment_executor: ThreadPoolExecutor) -> List[Dict[str, Any]]:
         subreddit_name = source.get('name')
         limit = source.get('limit', 20)
         sort_type = source.get('sort', 'hot')
         time_filter = source.get('time_filter', 'day')
         search_keywords = source.get('search_keywords', [])
         comment_depth = source.get('comment_depth', 0)
+        replace_more_limit = source.get('replace_more_limit', DEFAULT_REPLACE_MORE_LIMIT)
+        include_extended_fields = source.get('include_extended_fields', False)
 
         if not subreddit_name:
             raise ValueError("Subreddit name is required")
 
-        print(f"  -> Fetching r/{subreddit_name} (Limit: {limit}, Sort: {sort_type})")
-        subreddit = self.reddit.subreddit(subreddit_name)
-        
-        if search_keywords:
-            search_query = ' OR '.join(f'"{keyword}"' for keyword in search_keywords)
-            submissions = subreddit.search(search_query, limit=limit, sort='relevance', time_filter=time_filter)
-        else:
-            sort_func = getattr(subreddit, sort_type)
-            if sort_type == 'top':
-                submissions = sort_func(limit=limit, time_filter=time_filter)
+        logger.debug("Fetching r/%s (limit: %s, sort: %s)", subreddit_name, limit, sort_type)
+        with _checkout(self._listing_clients, CLIENT_CHECKOUT_TIMEOUT) as reddit:
+            subreddit = reddit.subreddit(subreddit_name)
+            
+            if search_keywords:
+                search_query = _build_search_query(tuple(search_keywords))
+                submissions = subreddit.search(search_query, limit=limit, sort='relevance', time_filter=time_filter)
             else:
-                submissions = sort_func(limit=limit)
-        
-        data = []
-        submission_count = 0
-        # --- DEBUG: Check if the submission loop is entered ---
-        print("  -> Iterating through submissions from PRAW...")
-        for submission in submissions:
-            submission_count += 1
-            print(f"    -> Found submission #{submission_count}: {submission.id}")
+                sort_func = getattr(subreddit, sort_type)
+                if sort_type == 'top':
+                    submissions = sort_func(limit=limit, time_filter=time_filter)
+                else:
+                    submissions = sort_func(limit=limit)
+            
+            # Listings are lazy; materializing them is what hits the API. Extraction below only
+            # reads fields from this payload, so the submissions never call back into the client.
+            submissions = list(submissions)
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, submission in enumerate(submissions, 1):
+                logger.debug("Found submission #%d: %s", i, submission.id)
+
+        def extract(submission):
             try:
-                post_data = self._extract_post_data(submission, subreddit_name, comment_depth)
-                data.append(post_data)
+                return self._extract_post_data(submission, subreddit_name, comment_depth, replace_more_limit, include_extended_fields)
             except Exception as e:
-                print(f"    ⚠️ Error processing post {submission.id}: {e}")
-                continue
+                logger.warning("Error processing post %s: %s", submission.id, e)
+                return None
+
+        if comment_depth > 0:
+            # Each submission's comments are separate round-trips, so overlap them
+            results = list(comment_executor.map(extract, submissions))
+        else:
+            results = [extract(submission) for submission in submissions]
+        data = [post_data for post_data in results if post_data is not None]
         
-        # --- DEBUG: Final count check ---
-        if submission_count == 0:
-            print("  -> WARNING: The PRAW query returned 0 submissions.")
-        print(f"  -> Finished processing. Total items extracted: {len(data)}")
-        # --- END DEBUG ---
+        if not submissions:
+            logger.warning("The PRAW query for r/%s returned 0 submissions", subreddit_name)
+        logger.debug("Finished r/%s, total items extracted: %d", subreddit_name, len(data))
         return data
 
-    def _fetch_comments(self, submission, max_depth: int) -> List[Dict[str, Any]]:
-        # ... (no changes in this function)
+    def _fetch_comments(self, submission, max_depth: int, replace_more_limit: Optional[int] = DEFAULT_REPLACE_MORE_LIMIT) -> List[Dict[str, Any]]:
         if max_depth == 0:
             return []
         comments_data = []
-        submission.comments.replace_more(limit=None)
-        for top_level_comment in submission.comments:
-            self._traverse_comments(top_level_comment, 1, max_depth, comments_data)
+        # The listing's submission belongs to a listing client, so load the comments through a
+        # comment client; the MoreComments it returns are bound to that client, so it's held for
+        # this post's expansions (bounded by replace_more_limit) and the walk.
+        with _checkout(self._comment_clients) as reddit:
+            comments = reddit.submission(id=submission.id).comments
+            # Each MoreComments expansion is a request; cap them and skip the small ones,
+            # unless the source asked for every comment (limit None)
+            threshold = 0 if replace_more_limit is None else 5
+            comments.replace_more(limit=replace_more_limit, threshold=threshold)
+            # Explicit stack instead of recursion so deep threads can't hit the recursion limit.
+            # Children are pushed in reverse so comments come out in the same depth-first order.
+            stack = [(comment, 1) for comment in reversed(comments)]
+            # Bound once; this loop runs per comment and threads can have thousands
+            append, push, pop = comments_data.append, stack.extend, stack.pop
+            while stack:
+                comment, depth = pop()
+                # Only Comment has a body; MoreComments placeholders are skipped
+                if not hasattr(comment, 'body'):
+                    continue
+                append({'comment_id': comment.id, 'text': comment.body, 'author': str(comment.author) if comment.author else '[deleted]', 'upvotes': comment.score, 'depth': depth, 'created_utc': comment.created_utc, 'created_datetime': _format_utc(comment.created_utc)})
+                if depth < max_depth:
+                    push((reply, depth + 1) for reply in reversed(comment.replies))
         return comments_data
 
-    def _traverse_comments(self, comment, current_depth: int, max_depth: int, comments_data: List):
-        # ... (no changes in this function)
-        if not isinstance(comment, praw.models.Comment) or current_depth > max_depth:
-            return
-        comments_data.append({'comment_id': comment.id, 'text': comment.body, 'author': str(comment.author) if comment.author else '[deleted]', 'upvotes': comment.score, 'depth': current_depth, 'created_utc': comment.created_utc, 'created_datetime': datetime.fromtimestamp(comment.created_utc).isoformat()})
-        for reply in comment.replies:
-            self._traverse_comments(reply, current_depth + 1, max_depth, comments_data)
-
-    def _extract_post_data(self, submission, subreddit_name: str, comment_depth: int) -> Dict[str, Any]:
-        # ... (no changes in this function)
-        comments = self._fetch_comments(submission, comment_depth) if comment_depth > 0 else []
-        return {'platform': 'Reddit', 'source_name': f'/r/{subreddit_name}', 'thread_id': submission.id, 'thread_title': submission.title, 'text': submission.selftext if submission.is_self else '', 'url': submission.url, 'permalink': f"https://reddit.com{submission.permalink}", 'upvotes': submission.score, 'num_comments_reported': submission.num_comments, 'author': str(submission.author) if submission.author else '[deleted]', 'created_utc': submission.created_utc, 'created_datetime': datetime.fromtimestamp(submission.created_utc).isoformat(), 'comments': comments, 'num_comments_scraped': len(comments)}
+    def _extract_post_data(self, submission, subreddit_name: str, comment_depth: int, replace_more_limit: Optional[int] = DEFAULT_REPLACE_MORE_LIMIT, include_extended_fields: bool = False) -> Dict[str, Any]:
+        # Listing submissions are lazy: reading an attribute missing from the listing payload makes
+        # PRAW fetch the whole submission, so only read fields the listing endpoint returns.
+        comments = self._fetch_comments(submission, comment_depth, replace_more_limit) if comment_depth > 0 else []
+        post_data = {'platform': 'Reddit', 'source_name': f'/r/{subreddit_name}', 'thread_id': submission.id, 'thread_title': submission.title, 'text': submission.selftext if submission.is_self else '', 'url': submission.url, 'permalink': f"https://reddit.com{submission.permalink}", 'upvotes': submission.score, 'num_comments_reported': submission.num_comments, 'author': str(submission.author) if submission.author else '[deleted]', 'created_utc': submission.created_utc, 'created_datetime': _format_utc(submission.created_utc), 'comments': comments, 'num_comments_scraped': len(comments)}
+        if include_extended_fields:
+            post_data.update({'upvote_ratio': submission.upvote_ratio, 'domain': submission.domain, 'over_18': submission.over_18, 'spoiler': submission.spoiler, 'stickied': submission.stickied, 'locked': submission.locked})
+        return post_data